@@ -3,30 +3,55 @@
 Пакетная конвертация всех MD файлов в PDF.
 Запуск: python batch_md_to_pdf.py
 """
+import os
 import sys
+from collections.abc import Iterator
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from pathlib import Path
 
 PROJECT_ROOT = Path(__file__).resolve().parent
 PYTHON_DOCS_DIR = PROJECT_ROOT
+SKIP_DIRS = {"scripts"}  # Каталоги, которые не конвертируем
 
 sys.path.insert(0, str(PROJECT_ROOT))
 from md_to_pdf import md_to_pdf
 
 
+def _iter_md(root: Path) -> Iterator[str]:
+    """Пути ко всем MD (кроме README.md) через os.scandir, без Path на каждую запись."""
+    stack = [str(root)]
+    while stack:
+        d = stack.pop()
+        with os.scandir(d) as it:
+            for e in it:
+                if e.is_dir(follow_symlinks=False):
+                    if e.name not in SKIP_DIRS:
+                        stack.append(e.path)
+                elif e.name.endswith(".md") and e.name != "README.md":
+                    yield e.path
+
+
+def _convert(md_path: str) -> str:
+    """Конвертировать один MD в PDF (выполняется в дочернем процессе)."""
+    pdf_path = md_path[:-3] + ".pdf"
+    md_to_pdf(md_path, pdf_path)
+    return pdf_path
+
+
 def main() -> None:
-    """Конвертировать все MD в PDF."""
-    md_files = list(PYTHON_DOCS_DIR.rglob("*.md"))
-    md_files = [f for f in md_files if f.name != "README.md"]
+    """Конвертировать все MD в PDF (параллельно, по процессу на ядро)."""
+    md_files = sorted(_iter_md(PYTHON_DOCS_DIR))
 
     failed = 0
-    for md_path in sorted(md_files):
-        pdf_path = md_path.with_suffix(".pdf")
-        try:
-            md_to_pdf(md_path, pdf_path)
-            print(f"OK: {pdf_path.relative_to(PYTHON_DOCS_DIR)}")
-        except Exception as e:
-            print(f"Ошибка {md_path.name}: {e}")
-            failed += 1
+    with ProcessPoolExecutor(max_workers=os.cpu_count()) as ex:
+        futures = {ex.submit(_convert, p): p for p in md_files}
+        for fut in as_completed(futures):
+            try:
+                pdf_path = Path(fut.result())
+                print(f"OK: {pdf_path.relative_to(PYTHON_DOCS_DIR)}")
+            except Exception as e:
+                print(f"Ошибка {Path(futures[fut]).name}: {e}")
+                failed += 1
 
     if failed:
         sys.exit(1)
@@ -4,37 +4,64 @@
 
 Возможности:
 - Загрузка ВСЕХ разделов документации (парсинг contents.html)
+- Параллельная загрузка страниц (пул потоков)
 - Детальное логгирование в файл и консоль
 - Возобновление с прерванного места при повторном запуске
 - Сохранение причины разрыва и места остановки
+- Обновление (--refresh): условные запросы (ETag / Last-Modified),
+  неизменённые страницы не скачиваются повторно
 
-Запуск: python fetch_python_docs.py
+Запуск: python fetch_python_docs.py [--refresh]
 
 Файлы состояния и логов:
 - .fetch_state.json — прогресс загрузки (для возобновления)
+- .fetch_state.jsonl — журнал загруженных URL между полными снимками состояния
 - fetch_python_docs.log — детальный лог
 """
+import importlib.util
+import io
 import json
 import logging
-import re
+import os
 import sys
+import time
 import traceback
+from collections.abc import Iterator
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
 from dataclasses import asdict, dataclass, field
 from pathlib import Path
-from urllib.error import HTTPError, URLError
-from urllib.request import urlopen
 
 try:
     from bs4 import BeautifulSoup
 except ImportError:
     BeautifulSoup = None  # type: ignore
 
+try:
+    from lxml import etree
+    from lxml import html as lxml_html
+except ImportError:
+    etree = None  # type: ignore
+    lxml_html = None  # type: ignore
+
+try:
+    import requests
+    from requests.adapters import HTTPAdapter
+except ImportError:
+    requests = None  # type: ignore
+
+# lxml (libxml2) разбирает HTML в разы быстрее встроенного html.parser
+_PARSER = "lxml" if importlib.util.find_spec("lxml") else "html.parser"
+
 BASE_URL = "https://docs.python.org/3"
 CONTENTS_URL = f"{BASE_URL}/contents.html"
 PROJECT_ROOT = Path(__file__).resolve().parent
 OUTPUT_DIR = PROJECT_ROOT
 STATE_FILENAME = ".fetch_state.json"
 LOG_FILENAME = "fetch_python_docs.log"
+MAX_WORKERS = 16  # Параллельных загрузок (I/O-bound)
+SAVE_STATE_EVERY = 50  # Полный снимок состояния раз в N успешных загрузок
+USER_AGENT = "docs-fetcher/1.0"
+PAGE_ENCODING = "utf-8"  # Кодировка страниц docs.python.org
 
 # Маппинг разделов docs.python.org -> локальные папки
 SECTION_TO_DIR: dict[str, str] = {
@@ -52,26 +79,37 @@ SECTION_TO_DIR: dict[str, str] = {
     "license": "12_MISC",
     "copyright": "12_MISC",
 }
+DEFAULT_SECTION_DIR = "99_OTHER"
 
 
 @dataclass
 class FetchState:
     """Состояние загрузки для возобновления."""
 
-    completed_urls: list[str] = field(default_factory=list)
+    completed_urls: set[str] = field(default_factory=set)
     failed_urls: dict[str, str] = field(default_factory=dict)
     last_url: str | None = None
     error_info: dict[str, str] | None = None
     total_planned: int = 0
+    etags: dict[str, str] = field(default_factory=dict)
+    last_modified: dict[str, str] = field(default_factory=dict)
 
     def should_skip(self, url_path: str) -> bool:
         """Пропустить URL если уже загружен."""
         return url_path in self.completed_urls
 
-    def mark_completed(self, url_path: str) -> None:
-        """Отметить URL как загруженный."""
-        if url_path not in self.completed_urls:
-            self.completed_urls.append(url_path)
+    def mark_completed(
+        self,
+        url_path: str,
+        etag: str | None = None,
+        last_modified: str | None = None,
+    ) -> None:
+        """Отметить URL как загруженный (и запомнить валидаторы HTTP-кэша)."""
+        self.completed_urls.add(url_path)
+        if etag:
+            self.etags[url_path] = etag
+        if last_modified:
+            self.last_modified[url_path] = last_modified
         self.last_url = url_path
         if url_path in self.failed_urls:
             del self.failed_urls[url_path]
@@ -122,24 +160,104 @@ def _safe_int(val: object, default: int) -> int:
         return default
 
 
+def _checkpoint_path(state_path: Path) -> Path:
+    """Путь к журналу загруженных URL рядом с файлом состояния."""
+    return state_path.with_suffix(".jsonl")
+
+
+class CheckpointLog:
+    """
+    Журнал загруженных URL (JSONL, только дозапись).
+    Между полными снимками состояния каждая загрузка стоит одной строки,
+    а не перезаписи всего файла состояния.
+    """
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        self._f = open(path, "a", encoding="utf-8", buffering=1)
+        # Оборванная при аварии последняя строка не должна склеиться со следующей
+        if path.stat().st_size:
+            with open(path, "rb") as tail:
+                tail.seek(-1, 2)
+                if tail.read(1) != b"\n":
+                    self._f.write("\n")
+
+    def append(
+        self,
+        url_path: str,
+        etag: str | None = None,
+        last_modified: str | None = None,
+    ) -> None:
+        """Записать URL как загруженный."""
+        record = {"ts": round(time.time(), 3), "url": url_path}
+        if etag:
+            record["etag"] = etag
+        if last_modified:
+            record["last_modified"] = last_modified
+        self._f.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+    def reset(self) -> None:
+        """Очистить журнал (после полного снимка он уже учтён)."""
+        self._f.truncate(0)
+
+    def close(self) -> None:
+        """Закрыть файл журнала."""
+        self._f.close()
+
+
+def _read_checkpoint(path: Path) -> list[dict[str, str]]:
+    """Прочитать записи журнала. Повреждённые строки (обрыв записи) пропускаются."""
+    if not path.exists():
+        return []
+    records: list[dict[str, str]] = []
+    try:
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                if isinstance(record, dict) and isinstance(record.get("url"), str):
+                    records.append(record)
+    except OSError:
+        return []
+    return records
+
+
 def load_state(state_path: Path) -> FetchState:
-    """Загрузить состояние из файла."""
+    """Загрузить состояние: полный снимок + загрузки из журнала после него."""
+    state = _load_snapshot(state_path)
+    for record in _read_checkpoint(_checkpoint_path(state_path)):
+        state.mark_completed(record["url"], record.get("etag"), record.get("last_modified"))
+    return state
+
+
+def _load_snapshot(state_path: Path) -> FetchState:
+    """Загрузить полный снимок состояния из файла."""
     if not state_path.exists():
         return FetchState()
     try:
         data = json.loads(state_path.read_text(encoding="utf-8"))
         completed = data.get("completed_urls", [])
         failed = data.get("failed_urls", {})
+        etags = data.get("etags", {})
+        last_modified = data.get("last_modified", {})
         if not isinstance(completed, list):
             completed = []
         if not isinstance(failed, dict):
             failed = {}
+        if not isinstance(etags, dict):
+            etags = {}
+        if not isinstance(last_modified, dict):
+            last_modified = {}
         return FetchState(
-            completed_urls=completed,
+            completed_urls=set(completed),
             failed_urls=failed,
             last_url=data.get("last_url"),
             error_info=data.get("error_info"),
             total_planned=_safe_int(data.get("total_planned"), 0),
+            etags=etags,
+            last_modified=last_modified,
         )
     except (json.JSONDecodeError, OSError, TypeError):
         return FetchState()
@@ -149,6 +267,7 @@ def save_state(state: FetchState, state_path: Path) -> None:
     """Сохранить состояние в файл (атомарно)."""
     state_path.parent.mkdir(parents=True, exist_ok=True)
     data = asdict(state)
+    data["completed_urls"] = sorted(state.completed_urls)  # set -> стабильный список
     content = json.dumps(data, ensure_ascii=False, indent=2)
     tmp_path = state_path.with_suffix(state_path.suffix + ".tmp")
     try:
@@ -169,17 +288,29 @@ def _url_to_output_path(url_path: str, output_dir: Path) -> Path:
         section = parts[0]
         name = "_".join(parts[1:]) if len(parts) > 1 else "index"
 
-    dir_name = SECTION_TO_DIR.get(section, "99_OTHER")
+    dir_name = SECTION_TO_DIR.get(section, DEFAULT_SECTION_DIR)
     out_dir = output_dir / dir_name
     return out_dir / f"{name}.md"
 
 
-def _extract_doc_urls_from_contents(html: str, base_url: str) -> list[str]:
-    """Извлечь все ссылки на документацию из contents.html."""
+def _list_existing_outputs(output_dir: Path) -> set[Path]:
+    """Все уже сохранённые MD в каталогах разделов (одно чтение каталога на раздел)."""
+    existing: set[Path] = set()
+    for dir_name in {*SECTION_TO_DIR.values(), DEFAULT_SECTION_DIR}:
+        try:
+            with os.scandir(output_dir / dir_name) as it:
+                existing.update(Path(e.path) for e in it if e.name.endswith(".md"))
+        except FileNotFoundError:
+            continue
+    return existing
+
+
+def _extract_doc_urls_from_contents(html: bytes, base_url: str) -> list[str]:
+    """Извлечь все ссылки на документацию из contents.html (без повторов, в порядке оглавления)."""
     if BeautifulSoup is None:
         raise ImportError("Установите beautifulsoup4: pip install beautifulsoup4")
-    soup = BeautifulSoup(html, "html.parser")
-    urls: set[str] = set()
+    soup = BeautifulSoup(html, _PARSER)
+    urls: dict[str, None] = {}  # dict сохраняет порядок появления
     prefix = f"{base_url}/"
 
     for a in soup.find_all("a", href=True):
@@ -188,90 +319,267 @@ def _extract_doc_urls_from_contents(html: str, base_url: str) -> list[str]:
             continue
         if href.startswith(prefix):
             path = href[len(prefix) :].lstrip("/")
-            urls.add(path)
+            urls[path] = None
         elif href.startswith("/3/"):
             path = href[3:].lstrip("/")
-            urls.add(path)
+            urls[path] = None
         elif "/" in href or href.startswith(
             ("tutorial", "library", "reference", "whatsnew", "using", "howto",
              "installing", "distributing", "extending", "faq", "c-api", "license", "copyright")
         ):
-            urls.add(href)
+            urls[href] = None
         elif href.endswith(".html"):
-            urls.add(href)
+            urls[href] = None
+
+    return list(urls)
+
 
-    return sorted(urls)
+def _make_session():
+    """Сессия HTTP с keep-alive пулом соединений и сжатием (gzip)."""
+    session = requests.Session()
+    session.headers.update({"Accept-Encoding": "gzip, deflate", "User-Agent": USER_AGENT})
+    adapter = HTTPAdapter(pool_connections=MAX_WORKERS, pool_maxsize=MAX_WORKERS * 2)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
 
 
-def fetch_page(url: str, timeout: int = 30) -> str:
-    """Загрузить страницу и вернуть HTML."""
+_SESSION = _make_session() if requests is not None else None
+
+
+@dataclass
+class FetchedPage:
+    """Ответ сервера на (условный) запрос страницы."""
+
+    content: bytes | None  # None — 304 Not Modified
+    etag: str | None = None
+    last_modified: str | None = None
+
+    @property
+    def not_modified(self) -> bool:
+        """Сервер ответил 304: страница не изменилась."""
+        return self.content is None
+
+
+def fetch_page_conditional(
+    url: str,
+    etag: str | None = None,
+    last_modified: str | None = None,
+    timeout: int = 30,
+) -> FetchedPage:
+    """Загрузить страницу, если она изменилась с прошлого раза (If-None-Match / If-Modified-Since)."""
+    if _SESSION is None:
+        raise ImportError("Установите requests: pip install requests")
     full_url = url if url.startswith("http") else f"{BASE_URL}/{url}"
-    with urlopen(full_url, timeout=timeout) as resp:
-        return resp.read().decode("utf-8", errors="replace")
+    headers = {}
+    if etag:
+        headers["If-None-Match"] = etag
+    if last_modified:
+        headers["If-Modified-Since"] = last_modified
+    r = _SESSION.get(full_url, headers=headers, timeout=timeout)
+    r.raise_for_status()
+    return FetchedPage(
+        content=None if r.status_code == 304 else r.content,
+        etag=r.headers.get("ETag") or etag,
+        last_modified=r.headers.get("Last-Modified") or last_modified,
+    )
+
+
+def fetch_page_bytes(url: str, timeout: int = 30) -> bytes:
+    """Загрузить страницу и вернуть HTML как есть (bytes, без декодирования)."""
+    return fetch_page_conditional(url, timeout=timeout).content
+
+
+_BLOCK_TAGS = ["h1", "h2", "h3", "h4", "h5", "h6", "p", "pre", "ul", "ol", "dl", "table"]
+# Блоки, которые нельзя сплющить в строку пункта списка
+_NESTED_BLOCK_TAGS = ["pre", "ul", "ol", "dl", "table"]
+
+
+def _text(elem, separator: str = "") -> str:
+    """Текст элемента: непустые фрагменты без крайних пробелов, через separator."""
+    return separator.join(t for t in (s.strip() for s in elem.itertext()) if t)
+
+
+def _emit_heading(elem, out: io.StringIO) -> None:
+    """Заголовок h1..h6 -> # ... ######."""
+    level = int(elem.tag[1])
+    text = _text(elem)
+    out.write(f"{'#' * level} {text}\n\n")
+
+
+def _emit_paragraph(elem, out: io.StringIO) -> None:
+    """Абзац одной строкой (пустые пропускаются)."""
+    text = _text(elem, " ")
+    if text:
+        out.write(f"{text}\n\n")
+
+
+def _emit_pre(elem, out: io.StringIO) -> None:
+    """Блок кода -> ``` (python, если похоже на Python)."""
+    code = elem.text_content()
+    lang = "python" if ">>>" in code or "def " in code else ""
+    out.write(f"```{lang}\n{code}\n```\n\n")
+
+
+def _has_nested_block(elem) -> bool:
+    """Есть ли внутри элемента блоки из _NESTED_BLOCK_TAGS."""
+    return next(elem.iter(*_NESTED_BLOCK_TAGS), None) is not None
 
 
-def html_to_markdown(html: str, base_url: str = BASE_URL) -> str:
+def _emit_list(elem, out: io.StringIO) -> None:
+    """
+    Список ul/ol -> "- " / "1. ". Пункт с вложенными блоками (код, списки, таблицы):
+    текст до первого блока — строкой пункта, блоки — рекурсивно, как dd в _emit_dl.
+    """
+    prefix = "- " if elem.tag == "ul" else "1. "
+    for li in elem.iterchildren("li"):
+        if not _has_nested_block(li):
+            out.write(f"{prefix}{_text(li, ' ')}\n")
+            continue
+        head = [li.text or ""]
+        blocks = []
+        for child in li.iterchildren(tag=etree.Element):
+            if blocks or _has_nested_block(child):
+                blocks.append(child)
+            else:
+                head.extend(child.itertext())
+                head.append(child.tail or "")
+        text = " ".join(t for t in (s.strip() for s in head) if t)
+        if text:
+            out.write(f"{prefix}{text}\n")
+        out.write("\n")
+        for child in blocks:
+            _emit_node(child, out)
+    out.write("\n")
+
+
+def _emit_dl(elem, out: io.StringIO) -> None:
+    """
+    Список определений: dd с вложенными блоками (описания классов/функций)
+    разворачиваем рекурсивно, простые определения пишем в одну строку с термином.
+    """
+    open_term = False
+    for child in elem.iterchildren("dt", "dd"):
+        if child.tag == "dt":
+            if open_term:
+                out.write("\n")
+            out.write(f"- **{_text(child)}**")
+            open_term = True
+        elif next(child.iter(*_BLOCK_TAGS), None) is not None:
+            out.write("\n\n")
+            _emit(child, out)
+            open_term = False
+        else:
+            defn = _text(child, " ")
+            out.write(f": {defn}\n" if open_term else f"{defn}\n")
+            open_term = False
+    if open_term:
+        out.write("\n")
+    out.write("\n")
+
+
+def _emit_table(elem, out: io.StringIO) -> None:
+    """Таблица -> строки | a | b | (символ | в ячейках экранируется)."""
+    for tr in elem.iter("tr"):
+        cells = [
+            _text(th).replace("|", "\\|")
+            for th in tr.iter("th", "td")
+        ]
+        if cells:
+            out.write("| " + " | ".join(cells) + " |\n")
+    out.write("\n")
+
+
+_EMITTERS = {
+    **{h: _emit_heading for h in ("h1", "h2", "h3", "h4", "h5", "h6")},
+    "p": _emit_paragraph,
+    "pre": _emit_pre,
+    "ul": _emit_list,
+    "ol": _emit_list,
+    "dl": _emit_dl,
+    "table": _emit_table,
+}
+
+
+def _emit(node, out: io.StringIO) -> None:
+    """
+    Один проход по дереву: блочные элементы конвертируются своим обработчиком,
+    в остальные контейнеры (div, section, ...) спускаемся рекурсивно.
+    """
+    for child in node.iterchildren(tag=etree.Element):
+        _emit_node(child, out)
+
+
+def _emit_node(elem, out: io.StringIO) -> None:
+    """Блочный элемент — своим обработчиком, контейнер — рекурсивно через _emit."""
+    emitter = _EMITTERS.get(elem.tag)
+    if emitter is not None:
+        emitter(elem, out)
+    else:
+        _emit(elem, out)
+
+
+def _class_xpath(tag: str, *classes: str) -> str:
+    """XPath для элементов tag с любым из CSS-классов (точное совпадение токена)."""
+    cond = " or ".join(f"contains(concat(' ', normalize-space(@class), ' '), ' {c} ')" for c in classes)
+    return f"//{tag}[{cond}]"
+
+
+# Выражения XPath компилируются один раз при импорте
+if etree is not None:
+    # Основной текст страницы Sphinx (docs.python.org): <div class="body" role="main">
+    _SPHINX_BODY_XPATH = etree.XPath(_class_xpath("div", "body"))
+    # Запасной вариант для других разметок
+    _CONTENT_DIV_XPATH = etree.XPath("//div[contains(@class, 'body') or contains(@class, 'content')]")
+    # Боковые панели, навигация и якоря «¶» у заголовков
+    _SIDE_PANELS_XPATH = etree.XPath(_class_xpath("*", "sphinxsidebar", "related", "headerlink"))
+else:
+    _SPHINX_BODY_XPATH = _CONTENT_DIV_XPATH = _SIDE_PANELS_XPATH = None
+
+
+def html_to_markdown(html: bytes, base_url: str = BASE_URL) -> str:
     """Конвертировать HTML в Markdown."""
-    if BeautifulSoup is None:
-        raise ImportError("Установите beautifulsoup4: pip install beautifulsoup4")
-    soup = BeautifulSoup(html, "html.parser")
-
-    for tag in soup.find_all(["nav", "footer", "script", "style"]):
-        tag.decompose()
-
-    main = soup.find("main") or soup.find("div", class_=re.compile("body|content"))
-    if not main:
-        main = soup.find("body") or soup
-
-    lines = []
-    for elem in main.find_all(["h1", "h2", "h3", "h4", "h5", "h6", "p", "pre", "ul", "ol", "dl", "table"]):
-        if elem.name and elem.name.startswith("h"):
-            level = int(elem.name[1])
-            text = elem.get_text(strip=True)
-            lines.append(f"\n{'#' * level} {text}\n")
-        elif elem.name == "p":
-            text = elem.get_text(separator=" ", strip=True)
-            if text:
-                lines.append(f"{text}\n\n")
-        elif elem.name == "pre":
-            code = elem.get_text()
-            lang = "python" if ">>>" in code or "def " in code else ""
-            lines.append(f"\n```{lang}\n{code}\n```\n\n")
-        elif elem.name in ("ul", "ol"):
-            for li in elem.find_all("li", recursive=False):
-                text = li.get_text(separator=" ", strip=True)
-                prefix = "- " if elem.name == "ul" else "1. "
-                lines.append(f"{prefix}{text}\n")
-            lines.append("\n")
-        elif elem.name == "dl":
-            for dt in elem.find_all("dt"):
-                term = dt.get_text(strip=True)
-                dd = dt.find_next_sibling("dd")
-                defn = dd.get_text(separator=" ", strip=True) if dd else ""
-                lines.append(f"- **{term}**: {defn}\n")
-            lines.append("\n")
-        elif elem.name == "table":
-            for tr in elem.find_all("tr"):
-                cells = [
-                    th.get_text(strip=True).replace("|", "\\|")
-                    for th in tr.find_all(["th", "td"])
-                ]
-                if cells:
-                    lines.append("| " + " | ".join(cells) + " |\n")
-            lines.append("\n")
-
-    return "\n".join(lines).strip()
+    if lxml_html is None:
+        raise ImportError("Установите lxml: pip install lxml")
+    # Декодирование выполняет libxml2 (C), без промежуточного str.
+    try:
+        tree = lxml_html.fromstring(html, parser=lxml_html.HTMLParser(encoding=PAGE_ENCODING))
+    except etree.ParserError:
+        return ""  # Пустая страница (или только комментарий) — как прежде с BeautifulSoup
+
+    for tag in list(tree.iter("nav", "footer", "script", "style")):
+        tag.drop_tree()
+    for tag in _SIDE_PANELS_XPATH(tree):
+        tag.drop_tree()
+
+    # Обходим только контейнер с текстом страницы, а не весь документ
+    found = _SPHINX_BODY_XPATH(tree)
+    main = found[0] if found else tree.find(".//main")
+    if main is None:
+        divs = _CONTENT_DIV_XPATH(tree)
+        main = divs[0] if divs else tree.find(".//body")
+    if main is None:
+        main = tree
+
+    out = io.StringIO()
+    _emit_node(main, out)  # корнем может оказаться и сам блок (фрагмент без <html>)
+    return out.getvalue().strip()
 
 
 def fetch_and_save_one(
     url_path: str,
     output_path: Path,
     logger: logging.Logger,
-) -> None:
-    """Загрузить одну страницу и сохранить в MD (атомарно)."""
+    etag: str | None = None,
+    last_modified: str | None = None,
+) -> FetchedPage:
+    """Загрузить одну страницу и сохранить в MD (атомарно). Неизменённую (304) не перезаписывать."""
+    page = fetch_page_conditional(url_path, etag, last_modified)
+    if page.not_modified:
+        logger.debug("Не изменилась: %s", url_path)
+        return page
     output_path.parent.mkdir(parents=True, exist_ok=True)
-    html = fetch_page(url_path)
-    md = html_to_markdown(html)
+    md = html_to_markdown(page.content)
     source_note = f"*Источник: https://docs.python.org/3/{url_path}*"
     md = f"# {output_path.stem}\n\n{source_note}\n\n---\n\n{md}"
     tmp_path = output_path.with_suffix(output_path.suffix + ".tmp")
@@ -282,6 +590,41 @@ def fetch_and_save_one(
         if tmp_path.exists():
             tmp_path.unlink(missing_ok=True)
     logger.info("Сохранено: %s -> %s", url_path, output_path.relative_to(OUTPUT_DIR))
+    return page
+
+
+def _iter_completed_bounded(
+    executor: ThreadPoolExecutor,
+    to_fetch: list[str],
+    validators: dict[str, tuple[str | None, str | None]],
+    logger: logging.Logger,
+    limit: int,
+) -> Iterator[tuple[Future, str]]:
+    """
+    Запускать загрузки так, чтобы одновременно в очереди было не более limit задач.
+    validators — (etag, last_modified) для условных запросов по URL.
+    Возвращает (future, url_path) по мере завершения. Новые задачи ставятся
+    по мере освобождения мест, поэтому при Ctrl+C отменять почти нечего.
+    """
+    pending = iter(to_fetch)
+    in_flight: dict[Future, str] = {}
+
+    def submit_next() -> None:
+        u = next(pending, None)
+        if u is not None:
+            etag, last_modified = validators.get(u, (None, None))
+            output_path = _url_to_output_path(u, OUTPUT_DIR)
+            fut = executor.submit(fetch_and_save_one, u, output_path, logger, etag, last_modified)
+            in_flight[fut] = u
+
+    for _ in range(limit):
+        submit_next()
+    while in_flight:
+        done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+        for fut in done:
+            url_path = in_flight.pop(fut)
+            submit_next()
+            yield fut, url_path
 
 
 def _cleanup_orphan_tmp_files(root: Path) -> int:
@@ -303,8 +646,11 @@ def _cleanup_orphan_tmp_files(root: Path) -> int:
     return removed
 
 
-def main() -> None:
-    """Основная функция с возобновлением и логгированием."""
+def main(refresh: bool = False) -> None:
+    """
+    Основная функция с возобновлением и логгированием.
+    refresh — перепроверить и уже загруженные страницы (условными запросами).
+    """
     OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
     state_path = OUTPUT_DIR / STATE_FILENAME
     logger = _setup_logging(OUTPUT_DIR)
@@ -328,82 +674,123 @@ def main() -> None:
 
     try:
         logger.info("Загрузка оглавления: %s", CONTENTS_URL)
-        contents_html = fetch_page(CONTENTS_URL)
+        contents_html = fetch_page_bytes(CONTENTS_URL)
         all_urls = _extract_doc_urls_from_contents(contents_html, BASE_URL)
         logger.info("Найдено страниц для загрузки: %d", len(all_urls))
-    except (HTTPError, URLError, OSError) as e:
+    except OSError as e:  # requests.RequestException наследует OSError
         logger.exception("Ошибка загрузки contents.html: %s", e)
         state.mark_failed("contents.html", str(e), traceback.format_exc())
         save_state(state, state_path)
         sys.exit(1)
 
-    to_fetch: list[str] = []
+    checkpoint = CheckpointLog(_checkpoint_path(state_path))
+
+    def snapshot() -> None:
+        """Полный снимок состояния; журнал после него не нужен."""
+        save_state(state, state_path)
+        checkpoint.reset()
+
+    all_urls_set = frozenset(all_urls)
+    to_fetch = [u for u in state.failed_urls if u in all_urls_set]
+    to_fetch_set = set(to_fetch)
     synced = 0
-    for u in state.failed_urls:
-        if u in all_urls:
-            to_fetch.append(u)
+    existing = _list_existing_outputs(OUTPUT_DIR)
+    validators: dict[str, tuple[str | None, str | None]] = {}
     for u in all_urls:
-        if u in to_fetch:
+        if u in to_fetch_set:
+            continue
+        output_path = _url_to_output_path(u, OUTPUT_DIR)
+        if refresh:
+            # Условный запрос имеет смысл, только если файл на диске есть
+            if output_path in existing:
+                validators[u] = (state.etags.get(u), state.last_modified.get(u))
+            to_fetch.append(u)
             continue
         if state.should_skip(u):
             continue
-        output_path = _url_to_output_path(u, OUTPUT_DIR)
-        if output_path.exists():
+        if output_path in existing:
             state.mark_completed(u)
             synced += 1
             continue
         to_fetch.append(u)
     if synced:
-        save_state(state, state_path)
+        snapshot()
         logger.info("Синхронизировано с диском (файлы уже есть): %d", synced)
 
     total = len(to_fetch)
     state.total_planned = len(all_urls)
-    logger.info("К пропуску (уже загружено): %d", len(state.completed_urls))
-    logger.info("К загрузке: %d", total)
-
-    for i, url_path in enumerate(to_fetch, 1):
-        try:
-            output_path = _url_to_output_path(url_path, OUTPUT_DIR)
-            logger.debug("[%d/%d] Загрузка %s", i, total, url_path)
-            fetch_and_save_one(url_path, output_path, logger)
-            state.mark_completed(url_path)
-            save_state(state, state_path)
-        except KeyboardInterrupt:
-            logger.warning("Прервано пользователем (Ctrl+C). Текущий URL: %s.", url_path)
-            save_state(state, state_path)
-            logger.info("Состояние сохранено. Повторный запуск возобновит с %s", url_path)
-            sys.exit(130)
-        except (HTTPError, URLError, OSError) as e:
-            err_msg = f"{type(e).__name__}: {e}"
-            logger.error("Ошибка [%d/%d] %s: %s", i, total, url_path, err_msg)
-            logger.debug("Трейсбек: %s", traceback.format_exc())
-            state.mark_failed(url_path, err_msg, traceback.format_exc())
-            save_state(state, state_path)
-            logger.warning(
-                "Скачивание прервано. URL: %s. Причина: %s. Повторный запуск возобновит с этого места.",
-                url_path,
-                err_msg,
-            )
-        except Exception as e:
-            err_msg = f"{type(e).__name__}: {e}"
-            tb = traceback.format_exc()
-            logger.exception("Неожиданная ошибка [%d/%d] %s: %s", i, total, url_path, err_msg)
-            state.mark_failed(url_path, err_msg, tb)
-            save_state(state, state_path)
-            logger.warning(
-                "Скачивание прервано. URL: %s. Причина: %s. Файл состояния: %s",
-                url_path,
-                err_msg,
-                state_path,
-            )
-            raise
+    if refresh:
+        # В режиме обновления ничего не пропускается: уже загруженные перепроверяются
+        logger.info("К загрузке: %d", total)
+        logger.info("Режим обновления: условных запросов %d", len(validators))
+    else:
+        logger.info("К пропуску (уже загружено): %d", len(state.completed_urls))
+        logger.info("К загрузке: %d", total)
+
+    # Загрузки выполняются в пуле потоков; состояние изменяется только
+    # в основном потоке (при разборе результатов), поэтому блокировка не нужна.
+    executor = ThreadPoolExecutor(max_workers=MAX_WORKERS)
+    unsaved = 0
+    unchanged = 0
+    url_path = to_fetch[0] if to_fetch else ""
+    try:
+        completed = _iter_completed_bounded(executor, to_fetch, validators, logger, MAX_WORKERS * 2)
+        for i, (fut, url_path) in enumerate(completed, 1):
+            try:
+                page = fut.result()
+                logger.debug("[%d/%d] Загружено %s", i, total, url_path)
+                unchanged += page.not_modified
+                state.mark_completed(url_path, page.etag, page.last_modified)
+                checkpoint.append(url_path, page.etag, page.last_modified)
+                unsaved += 1
+                if unsaved >= SAVE_STATE_EVERY:
+                    snapshot()
+                    unsaved = 0
+            except OSError as e:
+                err_msg = f"{type(e).__name__}: {e}"
+                logger.error("Ошибка [%d/%d] %s: %s", i, total, url_path, err_msg)
+                tb = traceback.format_exc()  # форматируется один раз: и для лога, и для состояния
+                logger.debug("Трейсбек: %s", tb)
+                state.mark_failed(url_path, err_msg, tb)
+                snapshot()
+                unsaved = 0
+                logger.warning(
+                    "Скачивание прервано. URL: %s. Причина: %s. Повторный запуск возобновит с этого места.",
+                    url_path,
+                    err_msg,
+                )
+            except Exception as e:
+                err_msg = f"{type(e).__name__}: {e}"
+                tb = traceback.format_exc()
+                logger.exception("Неожиданная ошибка [%d/%d] %s: %s", i, total, url_path, err_msg)
+                state.mark_failed(url_path, err_msg, tb)
+                snapshot()
+                logger.warning(
+                    "Скачивание прервано. URL: %s. Причина: %s. Файл состояния: %s",
+                    url_path,
+                    err_msg,
+                    state_path,
+                )
+                executor.shutdown(wait=False, cancel_futures=True)
+                raise
+    except KeyboardInterrupt:
+        logger.warning("Прервано пользователем (Ctrl+C). Последний URL: %s.", url_path)
+        executor.shutdown(wait=False, cancel_futures=True)
+        snapshot()
+        logger.info("Состояние сохранено. Повторный запуск продолжит с незагруженных страниц.")
+        sys.exit(130)
+    executor.shutdown()
+    if unsaved:
+        snapshot()
+    checkpoint.close()
 
     logger.info("=== Загрузка завершена ===")
     logger.info("Успешно: %d, Ошибок: %d", len(state.completed_urls), len(state.failed_urls))
+    if unchanged:
+        logger.info("Без изменений (304): %d", unchanged)
     if state.failed_urls:
         logger.warning("Не загружены: %s", list(state.failed_urls.keys())[:10])
 
 
 if __name__ == "__main__":
-    main()
+    main(refresh="--refresh" in sys.argv[1:])
@@ -4,12 +4,22 @@
 Использует reportlab для поддержки Unicode (русский язык).
 Запуск: python md_to_pdf.py input.md output.pdf
 """
+import functools
 import os
 import platform
 import sys
+from html import escape
 from pathlib import Path
 
 
+def _escape_code(text: str) -> str:
+    """Экранировать код для Preformatted (только & и <, как и раньше)."""
+    # str.replace выполняется в C и на порядок быстрее str.translate
+    # с многосимвольными заменами.
+    return text.replace("&", "&amp;").replace("<", "&lt;")
+
+
+@functools.lru_cache(maxsize=None)
 def _register_cyrillic_font():
     """Регистрирует шрифт с поддержкой кириллицы."""
     from reportlab.pdfbase import pdfmetrics
@@ -34,33 +44,11 @@ def _register_cyrillic_font():
     raise FileNotFoundError(f"Шрифт для кириллицы не найден: {font_path}")
 
 
-def md_to_pdf(md_path: str | Path, pdf_path: str | Path) -> None:
-    """Конвертировать MD файл в PDF."""
-    md_path = Path(md_path)
-    pdf_path = Path(pdf_path)
-
-    if not md_path.exists():
-        raise FileNotFoundError(f"Файл не найден: {md_path}")
-
-    try:
-        from reportlab.lib.pagesizes import A4
-        from reportlab.lib.styles import ParagraphStyle, getSampleStyleSheet
-        from reportlab.lib.units import cm
-        from reportlab.platypus import Paragraph, Preformatted, SimpleDocTemplate, Spacer
-    except ImportError:
-        raise ImportError("Установите reportlab: pip install reportlab")
+@functools.lru_cache(maxsize=None)
+def _get_styles(font_name: str):
+    """Стили документа (строятся один раз на процесс)."""
+    from reportlab.lib.styles import ParagraphStyle, getSampleStyleSheet
 
-    font_name = _register_cyrillic_font()
-    md_content = md_path.read_text(encoding="utf-8")
-
-    doc = SimpleDocTemplate(
-        str(pdf_path),
-        pagesize=A4,
-        rightMargin=2 * cm,
-        leftMargin=2 * cm,
-        topMargin=2 * cm,
-        bottomMargin=2 * cm,
-    )
     styles = getSampleStyleSheet()
     styles.add(
         ParagraphStyle(
@@ -94,15 +82,52 @@ def md_to_pdf(md_path: str | Path, pdf_path: str | Path) -> None:
             backColor="#f0f0f0",
         )
     )
+    return styles
+
+
+def md_to_pdf(md_path: str | Path, pdf_path: str | Path) -> None:
+    """Конвертировать MD файл в PDF."""
+    md_path = Path(md_path)
+    pdf_path = Path(pdf_path)
+
+    if not md_path.exists():
+        raise FileNotFoundError(f"Файл не найден: {md_path}")
+
+    try:
+        from reportlab.lib.pagesizes import A4
+        from reportlab.lib.units import cm
+        from reportlab.platypus import Paragraph, Preformatted, SimpleDocTemplate, Spacer
+    except ImportError:
+        raise ImportError("Установите reportlab: pip install reportlab")
+
+    font_name = _register_cyrillic_font()
+    md_content = md_path.read_text(encoding="utf-8")
+
+    doc = SimpleDocTemplate(
+        str(pdf_path),
+        pagesize=A4,
+        rightMargin=2 * cm,
+        leftMargin=2 * cm,
+        topMargin=2 * cm,
+        bottomMargin=2 * cm,
+    )
+    styles = _get_styles(font_name)
 
     story = []
     in_code_block = False
     code_lines = []
 
+    heading_styles = {
+        1: styles["CyrillicHeading1"],
+        2: styles["CyrillicHeading2"],
+        3: styles["CyrillicHeading2"],
+    }
+
     for line in md_content.split("\n"):
-        if line.strip().startswith("```"):
+        stripped = line.lstrip()
+        if stripped.startswith("```"):
             if in_code_block:
-                code_text = "\n".join(code_lines).replace("&", "&amp;").replace("<", "&lt;")
+                code_text = _escape_code("\n".join(code_lines))
                 story.append(Preformatted(code_text, styles["CyrillicCode"]))
                 story.append(Spacer(1, 6))
                 code_lines = []
@@ -113,21 +138,22 @@ def md_to_pdf(md_path: str | Path, pdf_path: str | Path) -> None:
             code_lines.append(line)
             continue
 
-        line = line.replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;")
+        if not stripped:
+            story.append(Spacer(1, 6))
+            continue
 
-        if line.startswith("# "):
-            story.append(Paragraph(line[2:], styles["CyrillicHeading1"]))
-        elif line.startswith("## "):
-            story.append(Paragraph(line[3:], styles["CyrillicHeading2"]))
-        elif line.startswith("### "):
-            story.append(Paragraph(line[4:], styles["CyrillicHeading2"]))
-        elif line.strip():
-            story.append(Paragraph(line, styles["Cyrillic"]))
+        line = escape(line, quote=False)
+
+        # Уровень заголовка: число ведущих '#', за которыми идёт пробел
+        level = len(line) - len(line.lstrip("#")) if line[0] == "#" else 0
+        style = heading_styles.get(level) if line[level : level + 1] == " " else None
+        if style is not None:
+            story.append(Paragraph(line[level + 1 :], style))
         else:
-            story.append(Spacer(1, 6))
+            story.append(Paragraph(line, styles["Cyrillic"]))
 
     if code_lines:
-        code_text = "\n".join(code_lines).replace("&", "&amp;").replace("<", "&lt;")
+        code_text = _escape_code("\n".join(code_lines))
         story.append(Preformatted(code_text, styles["CyrillicCode"]))
 
     doc.build(story)
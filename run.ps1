@@ -4,7 +4,7 @@
 $ProjectRoot = $PSScriptRoot
 Set-Location $ProjectRoot
 
-pip install beautifulsoup4 reportlab deep-translator -q 2>$null
+pip install beautifulsoup4 lxml requests reportlab deep-translator -q 2>$null
 
 Write-Host "=== 1. Загрузка с docs.python.org ===" -ForegroundColor Cyan
 python fetch_python_docs.py
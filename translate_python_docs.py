@@ -3,38 +3,94 @@
 Перевод документации Python с английского на русский.
 
 Возможности:
-- Атомарная запись (временный файл → rename) — при прерывании оригинал не повреждается
+- Атомарная запись (временный файл + fsync → rename) — при прерывании и сбое питания оригинал не повреждается
 - Возобновление с прерванного места при повторном запуске
+- Повторный перевод файлов, изменившихся после перевода (сравнение mtime, затем sha1)
 - Обработка KeyboardInterrupt (Ctrl+C)
 - Очистка orphan .tmp после аварийного завершения
 - Эвристика: пропуск уже переведённых (кириллица)
 - Retry при сетевых ошибках
 - Проверка свободного места на диске
 - Таймаут запросов к переводчику (избежание зависания)
+- Keep-alive: запросы к переводчику через одну HTTP-сессию с пулом соединений
+- Кэш переводов на диске (SQLite): повторные абзацы и перезапуски без запросов к API
+- Параллельные запросы к переводчику с ограничением частоты (token bucket)
+- Inline-код, ссылки и URL заменяются плейсхолдерами и не искажаются переводчиком
 
 Запуск: python translate_python_docs.py
 
-Файл состояния: .translate_state.json — список переведённых файлов
+Файл состояния: .translate_state.json — переведённые файлы (mtime и sha1 после перевода)
+Кэш переводов: .translate_cache.sqlite — хэш абзаца -> перевод
 """
+import atexit
+import hashlib
+import io
 import json
+import os
+import random
 import re
 import shutil
+import sqlite3
 import sys
+import threading
 import time
+from collections.abc import Iterator
 from concurrent.futures import ThreadPoolExecutor, TimeoutError as FuturesTimeoutError
+from email.utils import parsedate_to_datetime
 from pathlib import Path
 
+try:
+    import orjson  # Быстрая (де)сериализация состояния, необязательно
+except ImportError:
+    orjson = None
+
+try:
+    import requests  # Ставится вместе с deep-translator
+    from requests.adapters import HTTPAdapter
+except ImportError:
+    requests = None
+
 PROJECT_ROOT = Path(__file__).resolve().parent
 PYTHON_DOCS_DIR = PROJECT_ROOT
 MAX_CHUNK_LEN = 4500  # Лимит Google Translate
-SLEEP_BETWEEN = 0.5  # Задержка между запросами (сек)
+BATCH_SEP = "\n\n⟂SEP⟂\n\n"  # Разделитель абзацев в одном запросе (не переводится)
+SLEEP_BETWEEN = 0.5  # Базовая пауза перед повтором запроса (сек)
+BACKOFF_CAP = 30.0  # Максимальная пауза между повторами (сек)
+TRANSLATE_WORKERS = 8  # Параллельных запросов к переводчику
+RATE_LIMIT_PER_SEC = 2.0  # Средняя частота запросов к переводчику
+RATE_LIMIT_BURST = 4  # Допустимый всплеск запросов
 STATE_FILENAME = ".translate_state.json"
-TRANSLATE_RETRIES = 3  # Повторы при сетевой ошибке
+STATE_FLUSH_EVERY = 20  # Сохранять состояние раз в N переведённых файлов
+STATE_FLUSH_INTERVAL = 30.0  # ...или не реже, чем раз в N секунд
+CACHE_FILENAME = ".translate_cache.sqlite"
+SOURCE_LANG = "en"
+TARGET_LANG = "ru"
+TRANSLATE_RETRIES = 5  # Повторы при сетевой ошибке
 CYRILLIC_THRESHOLD = 0.35  # Доля кириллицы для "уже переведён"
+CYRILLIC_BYTES_THRESHOLD = 0.6  # Доля байт кириллицы в файле: точно переведён
+CYRILLIC_SAMPLE_CHARS = 4096  # Размер начала файла для быстрой проверки
+CYRILLIC_SAMPLE_MIN = 50  # Столько кириллических букв в начале — "уже переведён"
 REQUEST_TIMEOUT = 60  # Таймаут одного запроса к переводчику (сек)
 MIN_FREE_MB = 100  # Минимум свободного места на диске (МБ)
 
 
+# Регулярные выражения компилируются один раз при импорте
+_BLOCK_SPLIT_RE = re.compile(r"(```[\s\S]*?```|`[^`]+`|\[.*?\]\(.*?\)|https?://[^\s\)]+)")
+_PARA_RE = re.compile(r"(\n\n+)")
+_INLINE_CODE_RE = re.compile(r"`[^`]+`")
+_LINK_RE = re.compile(r"^\[.*\]\(http")
+# Плейсхолдер защищённого фрагмента; переводчик иногда добавляет пробелы внутри
+_SPAN_PLACEHOLDER_RE = re.compile(r"⟦\s*(\d+)\s*⟧")
+# Символ блока Cyrillic (U+0400..U+04FF) — для выборочной проверки начала файла
+# в _is_likely_translated; тот же диапазон, что считает _cyrillic_ratio по байтам 0xD0..0xD3
+_CYR_RE = re.compile(r"[\u0400-\u04FF]")
+
+# Для _cyrillic_ratio: в UTF-8 символы U+0400..U+04FF начинаются с байтов 0xD0..0xD3,
+# а всё, кроме ASCII-букв, удаляется bytes.translate — оба подсчёта выполняются в C.
+_CYR_LEAD_BYTES = (b"\xd0", b"\xd1", b"\xd2", b"\xd3")
+_NOT_ASCII_LETTERS = bytes(b for b in range(256) if not (65 <= b <= 90 or 97 <= b <= 122))
+
+
 def _check_disk_space(root: Path) -> None:
     """Проверить свободное место. Выход с ошибкой при нехватке."""
     check_path = root if root.exists() else Path.cwd()
@@ -61,30 +117,265 @@ def _path_to_key(path: Path) -> str:
         return str(path)
 
 
-def load_state(state_path: Path) -> set[str]:
-    """Загрузить множество переведённых файлов."""
-    if not state_path.exists():
-        return set()
+def _iter_md(root: Path) -> Iterator[str]:
+    """Пути ко всем MD (кроме README.md) через os.scandir, без Path на каждую запись."""
+    stack = [str(root)]
+    while stack:
+        d = stack.pop()
+        with os.scandir(d) as it:
+            for e in it:
+                if e.is_dir(follow_symlinks=False):
+                    stack.append(e.path)
+                elif e.name.endswith(".md") and e.name != "README.md":
+                    yield e.path
+
+
+def _fsync_dir(path: Path) -> None:
+    """fsync каталога — чтобы сам rename дошёл до диска (на Windows недоступно)."""
     try:
-        data = json.loads(state_path.read_text(encoding="utf-8"))
-        completed = data.get("completed", []) if isinstance(data, dict) else []
-        return set(completed) if isinstance(completed, list) else set()
-    except (json.JSONDecodeError, OSError, TypeError):
-        return set()
+        fd = os.open(str(path), os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
 
 
-def save_state(completed: set[str], state_path: Path) -> None:
-    """Сохранить состояние перевода (атомарно)."""
-    content = json.dumps({"completed": sorted(completed)}, ensure_ascii=False, indent=2)
-    tmp_path = state_path.with_suffix(state_path.suffix + ".tmp")
+def _atomic_write(path: Path, content: str | bytes) -> None:
+    """
+    Атомарная и надёжная запись: временный файл + fsync, затем rename.
+    Без fsync после сбоя питания на месте файла может оказаться пустой файл.
+    str пишется как текст UTF-8, bytes — как есть.
+    """
+    tmp_path = path.with_suffix(path.suffix + ".tmp")
+    renamed = False
     try:
-        tmp_path.write_text(content, encoding="utf-8")
-        tmp_path.replace(state_path)
+        if isinstance(content, bytes):
+            f = open(tmp_path, "wb")
+        else:
+            f = open(tmp_path, "w", encoding="utf-8")
+        with f:
+            f.write(content)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+        renamed = True
+        _fsync_dir(path.parent)
     finally:
-        if tmp_path.exists():
+        # После успешного rename временного файла уже нет — лишние syscalls не нужны
+        if not renamed:
             tmp_path.unlink(missing_ok=True)
 
 
+def load_state(state_path: Path) -> dict[str, dict]:
+    """
+    Загрузить переведённые файлы: ключ -> {"mtime", "sha1"} на момент перевода.
+    Старый формат (список ключей) читается с пустыми отпечатками.
+    """
+    if not state_path.exists():
+        return {}
+    try:
+        raw = state_path.read_bytes()
+        data = orjson.loads(raw) if orjson is not None else json.loads(raw)
+        completed = data.get("completed", []) if isinstance(data, dict) else []
+        if isinstance(completed, list):
+            return {key: {} for key in completed}
+        if isinstance(completed, dict):
+            return {k: v if isinstance(v, dict) else {} for k, v in completed.items()}
+        return {}
+    except (json.JSONDecodeError, OSError, TypeError, AttributeError):
+        return {}
+
+
+def _dumps_state(obj: dict, sort: bool) -> bytes:
+    """Компактный JSON состояния (orjson, если установлен)."""
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_SORT_KEYS if sort else 0)
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":"), sort_keys=sort).encode("utf-8")
+
+
+def save_state(completed: dict[str, dict], state_path: Path, sort: bool = True) -> None:
+    """Сохранить состояние перевода (атомарно). sort=False — быстрее, для промежуточных записей."""
+    _atomic_write(state_path, _dumps_state({"completed": completed}, sort))
+
+
+def _file_fingerprint(path: Path) -> dict:
+    """Отпечаток файла для состояния: mtime и sha1 содержимого."""
+    data = path.read_bytes()
+    return {"mtime": path.stat().st_mtime, "sha1": hashlib.sha1(data, usedforsecurity=False).hexdigest()}
+
+
+def _unchanged_fingerprint(path: str, info: dict) -> dict | None:
+    """
+    Отпечаток файла, если он не изменился после перевода; None — изменился
+    (например, заново скачан). Тот же mtime — без чтения файла; другой mtime —
+    сравнение sha1, и при совпадении возвращается отпечаток с новым mtime.
+    Без отпечатка (старый формат состояния) файл считаем неизменным.
+    """
+    mtime = info.get("mtime")
+    if mtime is None:
+        return info
+    try:
+        st = os.stat(path)
+        if st.st_mtime == mtime:
+            return info
+        with open(path, "rb") as f:
+            sha1 = hashlib.sha1(f.read(), usedforsecurity=False).hexdigest()
+    except OSError:
+        return None
+    return {"mtime": st.st_mtime, "sha1": sha1} if sha1 == info.get("sha1") else None
+
+
+class StateWriter:
+    """
+    Состояние перевода в памяти с отложенной записью на диск:
+    раз в STATE_FLUSH_EVERY файлов или STATE_FLUSH_INTERVAL секунд.
+    """
+
+    def __init__(self, state_path: Path, completed: dict[str, dict]) -> None:
+        self.state_path = state_path
+        self.completed = completed
+        self._dirty = 0
+        self._unsorted = False  # На диске промежуточная (несортированная) запись
+        self._last_flush = time.monotonic()
+
+    def mark(self, key: str, fingerprint: dict) -> None:
+        """Отметить файл переведённым (только в памяти)."""
+        self.completed[key] = fingerprint
+        self._dirty += 1
+
+    def maybe_flush(self) -> None:
+        """Сохранить, если накопилось достаточно изменений или прошло время."""
+        if self._dirty >= STATE_FLUSH_EVERY or (
+            self._dirty and time.monotonic() - self._last_flush >= STATE_FLUSH_INTERVAL
+        ):
+            self.flush(final=False)
+
+    def flush(self, final: bool = True) -> None:
+        """
+        Сохранить состояние, если есть несохранённые изменения.
+        Промежуточные записи (final=False) без сортировки ключей, итоговая — с ней.
+        """
+        if not (self._dirty or (final and self._unsorted)):
+            return
+        save_state(self.completed, self.state_path, sort=final)
+        self._dirty = 0
+        self._unsorted = not final
+        self._last_flush = time.monotonic()
+
+    def flush_quietly(self) -> None:
+        """Итоговый flush() для finally/atexit: ошибку только сообщить."""
+        try:
+            self.flush()
+        except OSError as e:
+            print(f"Ошибка сохранения состояния: {e}")
+
+
+class TokenBucket:
+    """Ограничитель частоты: rate запросов в секунду в среднем, всплеск до burst."""
+
+    def __init__(self, rate: float, burst: int) -> None:
+        self.rate = rate
+        self.capacity = float(burst)
+        self._tokens = float(burst)
+        self._ts = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, stop: threading.Event | None = None) -> bool:
+        """
+        Дождаться свободного токена (потокобезопасно).
+        False — ожидание прервано событием stop.
+        """
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._ts) * self.rate)
+                self._ts = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return True
+                wait = (1 - self._tokens) / self.rate
+            if stop is None:
+                time.sleep(wait)
+            elif stop.wait(wait):
+                return False
+
+
+_RATE_LIMITER = TokenBucket(RATE_LIMIT_PER_SEC, RATE_LIMIT_BURST)
+
+# Общий пул для запросов к переводчику (таймаут через future.result).
+# С запасом к TRANSLATE_WORKERS: зависший запрос занимает поток до своего завершения.
+_XLATE_POOL = ThreadPoolExecutor(max_workers=TRANSLATE_WORKERS * 2, thread_name_prefix="xlate")
+# Общий пул для групп абзацев (batch_translate); отдельный от _XLATE_POOL,
+# т.к. задачи группы сами ждут запросов в _XLATE_POOL.
+_BATCH_POOL = ThreadPoolExecutor(max_workers=TRANSLATE_WORKERS, thread_name_prefix="batch")
+# Остановка перевода: прерывает паузы backoff и ожидание токена в рабочих потоках
+_STOP = threading.Event()
+
+
+def _stop_translation() -> None:
+    """
+    Остановить рабочие потоки перевода: отменить задачи в очередях и прервать паузы.
+    Вызывается из main до выхода — потоки пулов не daemon, и интерпретатор
+    ждёт их завершения ещё до обработчиков atexit.
+    """
+    _STOP.set()
+    _BATCH_POOL.shutdown(wait=False, cancel_futures=True)
+    _XLATE_POOL.shutdown(wait=False, cancel_futures=True)
+
+
+class TranslationCache:
+    """Кэш переводов на диске (SQLite): хэш (языки + текст) -> перевод."""
+
+    def __init__(self, path: Path) -> None:
+        # Одно соединение на все потоки перевода, доступ под блокировкой
+        self._conn = sqlite3.connect(str(path), isolation_level=None, check_same_thread=False)
+        self._lock = threading.Lock()
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS t(k BLOB PRIMARY KEY, v TEXT)")
+
+    @staticmethod
+    def _key(text: str) -> bytes:
+        """Ключ записи: blake2b от пары языков и текста."""
+        raw = f"{SOURCE_LANG}|{TARGET_LANG}|{text}".encode("utf-8")
+        return hashlib.blake2b(raw, digest_size=16).digest()
+
+    def get(self, text: str) -> str | None:
+        """Перевод из кэша или None. Ошибки кэша не прерывают перевод."""
+        try:
+            with self._lock:
+                row = self._conn.execute("SELECT v FROM t WHERE k=?", (self._key(text),)).fetchone()
+        except sqlite3.Error:
+            return None
+        return row[0] if row else None
+
+    def put(self, text: str, translated: str) -> None:
+        """Сохранить перевод (ошибка записи в кэш не критична)."""
+        try:
+            with self._lock:
+                self._conn.execute("INSERT OR REPLACE INTO t(k, v) VALUES (?, ?)", (self._key(text), translated))
+        except sqlite3.Error:
+            pass
+
+    def close(self) -> None:
+        """Закрыть соединение с базой кэша."""
+        with self._lock:
+            self._conn.close()
+
+
+def _open_cache(path: Path) -> TranslationCache | None:
+    """Открыть кэш переводов. При ошибке — работа без кэша."""
+    try:
+        return TranslationCache(path)
+    except sqlite3.Error as e:
+        print(f"ВНИМАНИЕ: Кэш переводов недоступен ({e}), работа без кэша.\n")
+        return None
+
+
 def _cleanup_orphan_tmp_files(root: Path) -> int:
     """Удалить оставшиеся .tmp после аварийного завершения. Возвращает количество удалённых."""
     removed = 0
@@ -105,173 +396,392 @@ def _cleanup_orphan_tmp_files(root: Path) -> int:
 
 
 def _cyrillic_ratio(text: str) -> float:
-    """Доля символов кириллицы в тексте (игнорируя пробелы и код)."""
-    chars = [c for c in text if c.isalpha()]
-    if not chars:
-        return 0.0
-    cyrillic = sum(1 for c in chars if "\u0400" <= c <= "\u04FF")
-    return cyrillic / len(chars)
+    """Доля кириллицы среди букв текста (латиница + кириллица)."""
+    data = text.encode("utf-8")
+    cyrillic = sum(data.count(b) for b in _CYR_LEAD_BYTES)
+    letters = cyrillic + len(data.translate(None, _NOT_ASCII_LETTERS))
+    return cyrillic / letters if letters else 0.0
+
+
+def scan_fences(content: str) -> Iterator[tuple[str, str]]:
+    """
+    Разбить MD на ('text', ...) и ('code', ...) по ограждениям ```.
+    Линейный поиск через str.find; незакрытый блок считается текстом.
+    """
+    i = 0
+    while True:
+        j = content.find("```", i)
+        k = content.find("```", j + 3) if j >= 0 else -1
+        if k < 0:
+            if i < len(content):
+                yield "text", content[i:]
+            return
+        if j > i:
+            yield "text", content[i:j]
+        yield "code", content[j : k + 3]
+        i = k + 3
 
 
 def _is_likely_translated(content: str) -> bool:
     """Файл уже переведён (эвристика по доле кириллицы)."""
+    # Чистый ASCII — кириллицы нет, точно не переведён
+    if content.isascii():
+        return False
+    # Много кириллицы уже в начале — переведён, полный подсчёт не нужен
+    if len(_CYR_RE.findall(content, 0, CYRILLIC_SAMPLE_CHARS)) > CYRILLIC_SAMPLE_MIN:
+        return True
     # Берём только текстовые части, исключая код
-    no_code = re.sub(r"```[\s\S]*?```", " ", content)
-    no_code = re.sub(r"`[^`]+`", " ", no_code)
+    no_code = " ".join(chunk for kind, chunk in scan_fences(content) if kind == "text")
+    no_code = _INLINE_CODE_RE.sub(" ", no_code)
     return _cyrillic_ratio(no_code) >= CYRILLIC_THRESHOLD
 
 
+class _PerThreadTranslator:
+    """
+    GoogleTranslator хранит параметры запроса (в т.ч. текст) в самом экземпляре,
+    поэтому для параллельных запросов у каждого потока свой экземпляр.
+    """
+
+    def __init__(self, factory) -> None:
+        self._factory = factory
+        self._local = threading.local()
+
+    def translate(self, text: str) -> str:
+        """Перевести экземпляром текущего потока (создаётся при первом вызове)."""
+        translator = getattr(self._local, "translator", None)
+        if translator is None:
+            translator = self._local.translator = self._factory()
+        return translator.translate(text)
+
+
+class _KeepAliveRequests:
+    """
+    Замена модуля requests внутри deep_translator.google: get() идёт через одну
+    Session с пулом соединений (keep-alive) вместо нового TCP+TLS на каждый вызов.
+    """
+
+    def __init__(self) -> None:
+        self._session = requests.Session()
+        pool = TRANSLATE_WORKERS * 2  # = потоков в _XLATE_POOL
+        adapter = HTTPAdapter(pool_connections=pool, pool_maxsize=pool)
+        self._session.mount("https://", adapter)
+        self._session.mount("http://", adapter)
+
+    def get(self, url, **kwargs):
+        """requests.get через общую Session (с таймаутом по умолчанию)."""
+        # Таймаут на уровне сокета: зависший запрос освобождает поток пула
+        kwargs.setdefault("timeout", REQUEST_TIMEOUT)
+        return self._session.get(url, **kwargs)
+
+
+def _use_keep_alive_session() -> None:
+    """Подключить _KeepAliveRequests к deep_translator (если его устройство не изменилось)."""
+    try:
+        from deep_translator import google as dt_google
+    except ImportError:
+        return
+    if requests is not None and getattr(dt_google, "requests", None) is requests:
+        dt_google.requests = _KeepAliveRequests()
+
+
 def get_translator():
-    """Получить переводчик."""
+    """Получить переводчик (безопасный для вызова из нескольких потоков)."""
     try:
         from deep_translator import GoogleTranslator
 
-        return GoogleTranslator(source="en", target="ru")
+        _use_keep_alive_session()
+        return _PerThreadTranslator(lambda: GoogleTranslator(source=SOURCE_LANG, target=TARGET_LANG))
     except ImportError:
         print("Установите: pip install deep-translator")
         sys.exit(1)
 
 
-def split_preserving_blocks(content: str) -> list[tuple[str, str]]:
+def _retry_after(e: Exception) -> float | None:
     """
-    Разбить MD на блоки: ('text', chunk) или ('code', chunk).
-    code блоки не переводим.
+    Пауза по ответу сервера: Retry-After (секунды или HTTP-дата) при HTTP 429.
+    Для 429 без заголовка (в т.ч. TooManyRequests из deep_translator) — inf:
+    вызывающий берёт максимальную паузу из окна backoff.
     """
-    blocks = []
-    pattern = r"(```[\s\S]*?```|`[^`]+`|\[.*?\]\(.*?\)|https?://[^\s\)]+)"
-    parts = re.split(pattern, content)
-
-    for part in parts:
-        if not part.strip():
-            continue
-        if part.startswith("```") or (part.startswith("`") and part.endswith("`")):
-            blocks.append(("code", part))
-        elif part.startswith("http") or "](http" in part:
-            blocks.append(("skip", part))
-        else:
-            # Разбить длинный текст на части по предложениям/абзацам
-            for chunk in re.split(r"(\n\n+)", part):
-                if chunk.strip():
-                    blocks.append(("text", chunk))
-    return blocks
+    response = getattr(e, "response", None)
+    status = getattr(response, "status_code", None)
+    throttled = status == 429 or type(e).__name__ == "TooManyRequests"
+    if not throttled:
+        return None
+    value = getattr(response, "headers", {}).get("Retry-After") if response is not None else None
+    if value:
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            pass
+        try:
+            return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+        except (TypeError, ValueError):
+            pass
+    return float("inf")
 
 
-def _translate_with_retry(translator, text: str) -> str:
-    """Перевести с повторами при сетевых ошибках и таймауте."""
+def _request_with_retry(translator, text: str) -> str:
+    """
+    Запрос к переводчику с повторами при сетевых ошибках и таймауте.
+    Частота реальных запросов ограничивается общим _RATE_LIMITER.
+    Паузы между повторами — экспоненциальные с decorrelated jitter;
+    при HTTP 429 учитывается Retry-After. При неудаче — исходный текст.
+    """
     last_err: Exception | None = None
+    sleep_s = SLEEP_BETWEEN
     for attempt in range(TRANSLATE_RETRIES):
-        ex = ThreadPoolExecutor(max_workers=1)
+        if not _RATE_LIMITER.acquire(_STOP):
+            return text  # Перевод остановлен
+        future = _XLATE_POOL.submit(translator.translate, text)
+        retry_after = None
         try:
-            future = ex.submit(translator.translate, text)
             out = future.result(timeout=REQUEST_TIMEOUT)
-            return out if out is not None and isinstance(out, str) else text
+            if out is None or not isinstance(out, str):
+                return text
+            return out
         except FuturesTimeoutError:
+            future.cancel()  # ещё в очереди — не выполнять; зависший поток не ждём
             last_err = TimeoutError(f"Таймаут запроса ({REQUEST_TIMEOUT} сек)")
-            if attempt < TRANSLATE_RETRIES - 1:
-                time.sleep(SLEEP_BETWEEN * (attempt + 1))
         except Exception as e:
             last_err = e
-            if attempt < TRANSLATE_RETRIES - 1:
-                time.sleep(SLEEP_BETWEEN * (attempt + 1))
-        finally:
-            ex.shutdown(wait=False)  # Не ждать зависший поток
+            retry_after = _retry_after(e)
+        if attempt < TRANSLATE_RETRIES - 1:
+            if retry_after is None:
+                sleep_s = min(BACKOFF_CAP, random.uniform(SLEEP_BETWEEN, sleep_s * 3))
+            elif retry_after == float("inf"):
+                sleep_s = min(BACKOFF_CAP, sleep_s * 3)
+            else:
+                sleep_s = retry_after
+            if _STOP.wait(sleep_s):
+                return text  # Перевод остановлен
     print(f"  Ошибка перевода (после {TRANSLATE_RETRIES} попыток): {last_err}")
     return text
 
 
-def translate_chunk(translator, text: str) -> str:
+def _protect_spans(text: str) -> tuple[str, list[str]]:
+    """Заменить код, ссылки и URL на плейсхолдеры ⟦n⟧: (скелет, фрагменты)."""
+    spans: list[str] = []
+
+    def stash(m: re.Match) -> str:
+        spans.append(m.group(0))
+        return f"⟦{len(spans) - 1}⟧"
+
+    return _BLOCK_SPLIT_RE.sub(stash, text), spans
+
+
+def _restore_spans(translated: str, spans: list[str]) -> str | None:
+    """Вернуть фрагменты на место. None — если плейсхолдеры потеряны или искажены."""
+    if not spans and "⟦" not in translated:
+        return translated  # Защищать было нечего — без прохода регуляркой
+    # Один проход sub: индекс каждого плейсхолдера разбирается один раз
+    seen: list[int] = []
+
+    def put_back(m: re.Match) -> str:
+        n = int(m.group(1))
+        seen.append(n)
+        return spans[n] if n < len(spans) else m.group(0)
+
+    restored = _SPAN_PLACEHOLDER_RE.sub(put_back, translated)
+    if len(seen) != len(spans) or sorted(seen) != list(range(len(spans))):
+        return None
+    return restored
+
+
+def _cached_translation(cache: TranslationCache | None, skeleton: str, spans: list[str]) -> str | None:
+    """Перевод из кэша по скелету (ключ — текст с плейсхолдерами) с восстановленными фрагментами."""
+    if cache is None:
+        return None
+    cached = cache.get(skeleton)
+    return _restore_spans(cached, spans) if cached is not None else None
+
+
+def _translate_with_retry(translator, text: str, cache: TranslationCache | None = None) -> str:
+    """
+    Перевести текст, не отправляя переводчику код, ссылки и URL (плейсхолдеры ⟦n⟧).
+    Кэш хранит перевод скелета: одинаковые фразы с разными ссылками — одна запись.
+    Если переводчик испортил плейсхолдеры — переводим исходный текст целиком.
+    """
+    skeleton, spans = _protect_spans(text)
+    restored = _cached_translation(cache, skeleton, spans)
+    if restored is not None:
+        return restored
+    out = _request_with_retry(translator, skeleton)
+    restored = _restore_spans(out, spans)
+    if restored is None:
+        return _request_with_retry(translator, text)
+    if cache is not None and out != skeleton:
+        cache.put(skeleton, out)
+    return restored
+
+
+def translate_chunk(translator, text: str, cache: TranslationCache | None = None) -> str:
     """Перевести фрагмент с учётом лимита длины."""
     text = text.strip()
     if not text or len(text) < 10:
         return text
 
     if len(text) > MAX_CHUNK_LEN:
-        parts = re.split(r"(\n\n+)", text)
+        parts = _PARA_RE.split(text)
         result = []
-        buf = ""
+        # Накопление кусков списком с отдельным счётчиком длины (без buf += p)
+        buf_parts: list[str] = []
+        buf_len = 0
         for p in parts:
-            if len(buf) + len(p) > MAX_CHUNK_LEN and buf:
-                result.append(_translate_with_retry(translator, buf))
-                time.sleep(SLEEP_BETWEEN)
-                buf = p
+            if buf_parts and buf_len + len(p) > MAX_CHUNK_LEN:
+                result.append(_translate_with_retry(translator, "".join(buf_parts), cache))
+                buf_parts, buf_len = [p], len(p)
             else:
-                buf += p
-        if buf:
-            result.append(_translate_with_retry(translator, buf))
-            time.sleep(SLEEP_BETWEEN)
+                buf_parts.append(p)
+                buf_len += len(p)
+        if buf_parts:
+            result.append(_translate_with_retry(translator, "".join(buf_parts), cache))
         return "".join(result)
 
-    return _translate_with_retry(translator, text)
+    return _translate_with_retry(translator, text, cache)
+
+
+def _translate_group(translator, texts: list[str], cache: TranslationCache | None) -> list[str]:
+    """
+    Перевести группу абзацев одним запросом; при сбое разделителя — по одному.
+    Каждый абзац защищается отдельно, в кэш пишется перевод его скелета.
+    """
+    if len(texts) == 1:
+        return [translate_chunk(translator, texts[0], cache)]
+    protected = [_protect_spans(t) for t in texts]
+    joined = BATCH_SEP.join(skeleton for skeleton, _ in protected)
+    out = _request_with_retry(translator, joined)
+    parts = [p.strip() for p in out.split(BATCH_SEP.strip())]
+    if len(parts) != len(texts):
+        return [translate_chunk(translator, t, cache) for t in texts]
+    result = []
+    for text, (skeleton, spans), part in zip(texts, protected, parts):
+        restored = _restore_spans(part, spans)
+        if restored is None:
+            # Плейсхолдеры этого абзаца испорчены — перевести его отдельно
+            result.append(translate_chunk(translator, text, cache))
+            continue
+        if cache is not None and part != skeleton:
+            cache.put(skeleton, part)
+        result.append(restored)
+    return result
 
 
-def translate_md_file(path: Path, translator) -> bool:
+def batch_translate(translator, paragraphs: list[str], cache: TranslationCache | None = None) -> list[str]:
+    """
+    Перевести список абзацев, упаковывая их в запросы до MAX_CHUNK_LEN символов.
+    Повторяющиеся абзацы переводятся один раз (L1 — словарь на вызов), затем
+    проверяется кэш на диске (L2); абзац длиннее лимита переводится отдельно.
+    Возвращает абзацы без начальных/конечных пробелов; при ошибке — исходный текст.
+    """
+    texts = [p.strip() for p in paragraphs]
+    memo: dict[str, str | None] = dict.fromkeys(texts)  # уникальные абзацы в порядке появления
+    groups: list[list[str]] = []
+    group: list[str] = []
+    group_len = 0
+    for text in memo:
+        cached = _cached_translation(cache, *_protect_spans(text))
+        if cached is not None:
+            memo[text] = cached
+            continue
+        add_len = len(text) + (len(BATCH_SEP) if group else 0)
+        if group and group_len + add_len > MAX_CHUNK_LEN:
+            groups.append(group)
+            group, group_len, add_len = [], 0, len(text)
+        group.append(text)
+        group_len += add_len
+    if group:
+        groups.append(group)
+
+    # Группы переводятся параллельно в общем _BATCH_POOL; частоту запросов ограничивает _RATE_LIMITER
+    futures = [_BATCH_POOL.submit(_translate_group, translator, g, cache) for g in groups]
+    try:
+        for group, future in zip(groups, futures):
+            try:
+                translated = future.result()
+            except Exception:
+                continue
+            for text, out in zip(group, translated):
+                memo[text] = out
+    except BaseException:
+        # Ctrl+C: оставшиеся группы этого файла не запускать
+        for future in futures:
+            future.cancel()
+        raise
+    # Без перевода — очищенный текст: пробелы вокруг абзаца добавляет вызывающий
+    return [text if memo[text] is None else memo[text] for text in texts]
+
+
+def translate_md_file(path: Path, translator, cache: TranslationCache | None = None) -> bool:
     """Перевести один MD файл. Код блоки не трогаем."""
     try:
-        content = path.read_text(encoding="utf-8")
+        data = path.read_bytes()
     except FileNotFoundError:
         raise FileNotFoundError(f"Файл удалён: {path}") from None
     except PermissionError:
         raise PermissionError(f"Нет доступа к чтению: {path}") from None
-    except UnicodeDecodeError as e:
-        raise ValueError(f"Некорректная кодировка {path}: {e}") from e
     except OSError as e:
         raise OSError(f"Ошибка чтения {path}: {e}") from e
 
+    # Быстрая проверка по байтам, без декодирования: кириллица в UTF-8 —
+    # два байта с ведущим 0xD0/0xD1. Явно переведённый файл сразу пропускаем.
+    if 2 * (data.count(b"\xd0") + data.count(b"\xd1")) >= CYRILLIC_BYTES_THRESHOLD * len(data):
+        return True  # Пустой или уже переведён
+    try:
+        content = data.decode("utf-8")
+    except UnicodeDecodeError as e:
+        raise ValueError(f"Некорректная кодировка {path}: {e}") from e
+    if "\r" in content:
+        # Как read_text: универсальные переводы строк
+        content = content.replace("\r\n", "\n").replace("\r", "\n")
+
     if not content.strip():
         return True  # Пустой файл — считаем обработанным
 
     if _is_likely_translated(content):
         return True  # Уже переведён (эвристика) — пропустить
 
-    # Заменить код-блоки на плейсхолдеры
-    code_blocks = []
-
-    def save_code(m):
-        code_blocks.append(m.group(0))
-        return f"\n\n__CODE_BLOCK_{len(code_blocks)-1}__\n\n"
+    # Код-блоки (scan_fences) и разделители абзацев переносятся как есть,
+    # остальное — абзацы. Переводимые собираем и переводим пакетами.
+    segments: list[str] = []
+    to_translate: list[int] = []
+
+    def add_paragraph(p: str) -> None:
+        core = p.strip()
+        # Проверить: не ссылка, не URL, не слишком короткий
+        if core and not (_LINK_RE.match(core) or core.startswith("http")) and len(core) > 15:
+            to_translate.append(len(segments))
+        if p:
+            segments.append(p)
+
+    for kind, chunk in scan_fences(content):
+        if kind == "code":
+            segments.append(chunk)
+            continue
+        # split с группой: чётные элементы — абзацы, нечётные — разделители
+        for j, piece in enumerate(_PARA_RE.split(chunk)):
+            if j % 2:
+                segments.append(piece)
+            else:
+                add_paragraph(piece)
 
-    temp = re.sub(r"```[\s\S]*?```", save_code, content)
+    translated = batch_translate(translator, [segments[i] for i in to_translate], cache)
+    for i, text in zip(to_translate, translated):
+        # Сохранить исходные пробелы/переносы вокруг абзаца (например, перед ```)
+        p = segments[i]
+        lead = p[: len(p) - len(p.lstrip())]
+        trail = p[len(p.rstrip()):]
+        segments[i] = lead + text + trail
 
-    # Перевести по абзацам (двойной перенос)
-    paragraphs = re.split(r"(\n\n+)", temp)
-    result = []
-    for p in paragraphs:
-        if p.startswith("__CODE_BLOCK_"):
-            idx = int(re.search(r"(\d+)", p).group(1))
-            result.append(code_blocks[idx])
-        elif p.strip() and not p.isspace():
-            # Проверить: не ссылка, не URL
-            if re.match(r"^\[.*\]\(http", p) or p.startswith("http"):
-                result.append(p)
-            else:
-                if len(p.strip()) > 15:
-                    try:
-                        result.append(translate_chunk(translator, p))
-                        time.sleep(SLEEP_BETWEEN)
-                    except Exception:
-                        result.append(p)
-                else:
-                    result.append(p)
-        else:
-            result.append(p)
+    out = io.StringIO()
+    for seg in segments:
+        out.write(seg)
 
     # Атомарная запись: сначала во временный файл, затем rename.
     # При прерывании во время записи оригинал не повреждается.
-    content = "".join(result)
-    tmp_path = path.with_suffix(path.suffix + ".tmp")
     try:
-        tmp_path.write_text(content, encoding="utf-8")
-        tmp_path.replace(path)
+        _atomic_write(path, out.getvalue())
     except OSError as e:
-        if tmp_path.exists():
-            try:
-                tmp_path.unlink()
-            except OSError:
-                pass
         raise OSError(f"Ошибка записи {path}: {e}") from e
-    finally:
-        if tmp_path.exists():
-            tmp_path.unlink(missing_ok=True)
     return True
 
 
@@ -291,39 +801,57 @@ def main() -> None:
     completed = load_state(state_path)
     if completed:
         print(f"Возобновление: пропуск {len(completed)} уже переведённых файлов.\n")
+    state = StateWriter(state_path, completed)
+    atexit.register(state.flush_quietly)
 
     translator = get_translator()
-    md_files = sorted(PYTHON_DOCS_DIR.rglob("*.md"))
-    md_files = [f for f in md_files if f.name != "README.md"]
-
-    to_translate = [f for f in md_files if _path_to_key(f) not in completed]
+    cache = _open_cache(PYTHON_DOCS_DIR / CACHE_FILENAME)
+    # Ключ состояния — путь относительно каталога; Path создаём только для непереведённых
+    prefix_len = len(os.path.join(str(PYTHON_DOCS_DIR), ""))
+    md_files = sorted(_iter_md(PYTHON_DOCS_DIR))
+    to_translate: list[Path] = []
+    for f in md_files:
+        key = f[prefix_len:]
+        info = completed.get(key)
+        if info is not None:
+            fingerprint = _unchanged_fingerprint(f, info)
+            if fingerprint is not None:
+                if fingerprint is not info:
+                    state.mark(key, fingerprint)  # Содержимое то же, новый mtime
+                continue
+        to_translate.append(Path(f))
     total = len(to_translate)
 
-    for i, path in enumerate(to_translate, 1):
-        rel = path.relative_to(PYTHON_DOCS_DIR)
-        print(f"[{i}/{total}] {rel}")
-        try:
-            translate_md_file(path, translator)
-            completed.add(_path_to_key(path))
-            try:
-                save_state(completed, state_path)
-            except OSError as e:
-                print(f"  ОШИБКА сохранения состояния: {e}")
-            print("  OK")
-        except KeyboardInterrupt:
-            print("\nПрервано пользователем (Ctrl+C).")
+    try:
+        for i, path in enumerate(to_translate, 1):
+            rel = path.relative_to(PYTHON_DOCS_DIR)
+            print(f"[{i}/{total}] {rel}")
             try:
-                save_state(completed, state_path)
-                print("Состояние сохранено.")
-            except OSError as e:
-                print(f"Ошибка сохранения состояния: {e}")
-            print(f"Повторный запуск возобновит с {rel}")
-            sys.exit(130)
-        except (FileNotFoundError, PermissionError, OSError, ValueError) as e:
-            print(f"  ОШИБКА: {e}")
-        except Exception as e:
-            print(f"  ОШИБКА: {type(e).__name__}: {e}")
-
+                translate_md_file(path, translator, cache)
+                state.mark(_path_to_key(path), _file_fingerprint(path))
+                try:
+                    state.maybe_flush()
+                except OSError as e:
+                    print(f"  ОШИБКА сохранения состояния: {e}")
+                print("  OK")
+            except KeyboardInterrupt:
+                print("\nПрервано пользователем (Ctrl+C).")
+                try:
+                    state.flush()
+                    print("Состояние сохранено.")
+                except OSError as e:
+                    print(f"Ошибка сохранения состояния: {e}")
+                print(f"Повторный запуск возобновит с {rel}")
+                sys.exit(130)
+            except (FileNotFoundError, PermissionError, OSError, ValueError) as e:
+                print(f"  ОШИБКА: {e}")
+            except Exception as e:
+                print(f"  ОШИБКА: {type(e).__name__}: {e}")
+    finally:
+        _stop_translation()
+        state.flush_quietly()
+        if cache is not None:
+            cache.close()
     print("\nПеревод завершён.")
 
 